@@ -7,6 +7,8 @@ import json
 from datetime import datetime
 import csv
 import time
+import sqlite3
+import hashlib
 from dotenv import load_dotenv
 
 def auto_convert_xls_to_xlsx(tmp_path):
@@ -28,6 +30,461 @@ def auto_convert_xls_to_xlsx(tmp_path):
     return new_xlsx_path
 
 
+def normalize_col_name(name):
+    """
+    Normalizes a column header for matching across files:
+    case, surrounding spaces, underscores and repeated whitespace are ignored.
+    """
+    return " ".join(str(name).replace("_", " ").split()).lower()
+
+
+HEADER_SCAN_ROWS = 20
+
+
+def first_filled_row(rows):
+    """
+    Returns the index of the first row with any non-blank cell, or None.
+    """
+    for i, row in enumerate(rows):
+        if any(c is not None and str(c).strip() for c in row):
+            return i
+    return None
+
+
+def read_sheets(source, header_rows, engine):
+    """
+    Parses the sheets that have a header row, one read per distinct header row.
+    If no header row was found anywhere, the first sheet is read as-is.
+    Returns ({sheet_name: DataFrame}, [skipped sheet names]).
+    """
+    by_header = {}
+    for name, header in header_rows.items():
+        if header is not None:
+            by_header.setdefault(header, []).append(name)
+
+    parsed = {}
+    for header, names in by_header.items():
+        parsed.update(pd.read_excel(source, sheet_name=names, header=header, engine=engine))
+
+    sheets = {name: parsed[name] for name in header_rows if name in parsed}
+    skipped = [name for name in header_rows if name not in parsed]
+
+    if not sheets:
+        # 🔹 Nothing found near the top: read the first sheet as before
+        first = next(iter(header_rows))
+        sheets = {first: pd.read_excel(source, sheet_name=first, engine=engine)}
+        skipped.remove(first)
+
+    return sheets, skipped
+
+
+def parse_excel_file(tmp_path, file_name):
+    """
+    Parses every non-empty sheet of an uploaded workbook.
+    The header row of each sheet is the first non-blank row within the
+    first HEADER_SCAN_ROWS rows; sheets with none are skipped.
+    Returns ({sheet_name: DataFrame}, [skipped sheet names]).
+    """
+    if file_name.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        # 🔹 Header-only read: only the top rows of each sheet are loaded
+        wb = load_workbook(tmp_path, read_only=True)
+        try:
+            header_rows = {
+                ws.title: first_filled_row(ws.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True))
+                for ws in wb.worksheets
+            }
+        finally:
+            wb.close()
+
+        return read_sheets(tmp_path, header_rows, "openpyxl")
+
+    if file_name.endswith(".xls"):
+        import xlrd
+
+        try:
+            # 1️⃣ Try real Excel (opened once, pandas reuses the book)
+            book = xlrd.open_workbook(tmp_path)
+        except Exception:
+            book = None
+
+        if book is not None:
+            try:
+                header_rows = {
+                    sheet.name: first_filled_row(
+                        sheet.row_values(i) for i in range(min(sheet.nrows, HEADER_SCAN_ROWS))
+                    )
+                    for sheet in book.sheets()
+                }
+                return read_sheets(book, header_rows, "xlrd")
+            finally:
+                book.release_resources()
+
+        try:
+            # 2️⃣ Try HTML based XLS (first table only; the rest are layout)
+            return {"Sheet1": pd.read_html(tmp_path)[0]}, []
+        except Exception:
+            # 3️⃣ Try CSV-style disguised XLS (GST / reports)
+            return {"Sheet1": pd.read_csv(tmp_path, sep=None, engine="python")}, []
+
+    raise ValueError("Unsupported file type")
+
+
+def column_keys(columns):
+    """
+    Returns (match key, occurrence) for each column. Columns that normalize
+    to a name already used in the same sheet get a numbered key, so both are kept.
+    """
+    keys = []
+    seen = {}
+
+    for col in columns:
+        norm = normalize_col_name(col)
+        seen[norm] = seen.get(norm, 0) + 1
+        n = seen[norm]
+        keys.append((norm if n == 1 else f"{norm} ({n})", n))
+
+    return keys
+
+
+def align_frames(frames):
+    """
+    Aligns (file_name, sheet_name, df) frames onto one schema.
+    Columns are mapped by normalized name, reordered to the first-seen
+    order and unioned; columns missing from a frame are filled with nulls.
+    Returns (combined_df, notes) where notes lists per-sheet schema differences.
+    """
+    canonical = {}
+
+    for _, _, df in frames:
+        for col, (key, n) in zip(df.columns, column_keys(df.columns)):
+            canonical.setdefault(key, col if n == 1 else f"{str(col).strip()} ({n})")
+
+    all_cols = list(canonical.values())
+    aligned = []
+    notes = []
+
+    for file_name, sheet_name, df in frames:
+        keys = column_keys(df.columns)
+        mapping = {col: canonical[key] for col, (key, _) in zip(df.columns, keys)}
+        kept_apart = [f"{col} → {mapping[col]}" for col, (_, n) in zip(df.columns, keys) if n > 1]
+        renamed = [
+            f"{col} → {mapping[col]}" for col, (_, n) in zip(df.columns, keys)
+            if n == 1 and col != mapping[col]
+        ]
+
+        df = df.rename(columns=mapping)
+        missing = [col for col in all_cols if col not in df.columns]
+
+        if renamed or missing or kept_apart:
+            note = f"{file_name} / {sheet_name}:"
+            if kept_apart:
+                note += f" repeated column name kept separately as {', '.join(kept_apart)};"
+            if renamed:
+                note += f" renamed {', '.join(map(str, renamed))};"
+            if missing:
+                note += f" missing {', '.join(map(str, missing))} (left blank);"
+            notes.append(note)
+
+        df = df.reindex(columns=all_cols)
+        df["__source_file__"] = file_name
+        df["__source_sheet__"] = sheet_name
+        aligned.append(df)
+
+    return pd.concat(aligned, ignore_index=True), notes
+
+
+# ==================================================
+# ============ RECONCILIATION STATE ================
+# ==================================================
+
+RECO_DB_FILE = "reco_state.db"
+RECO_KEY_COLS = ["__amt__", "__date__", "__narr__"]
+
+
+def open_reco_db():
+    """
+    Opens the local reconciliation store, creating it on first use.
+    reco_items holds every bank/books row seen per user and account
+    (open or matched), reco_matches holds the match history and
+    reco_mappings the column mapping each side was first saved with.
+    """
+    conn = sqlite3.connect(RECO_DB_FILE)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS reco_items (
+            owner TEXT NOT NULL,
+            account TEXT NOT NULL,
+            side TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            amt REAL,
+            txn_date TEXT,
+            narr TEXT,
+            row_json TEXT NOT NULL,
+            status TEXT NOT NULL,
+            added_at TEXT NOT NULL,
+            PRIMARY KEY (owner, account, side, row_hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_reco_items_open
+            ON reco_items (owner, account, side, status, amt, txn_date);
+        CREATE TABLE IF NOT EXISTS reco_matches (
+            owner TEXT NOT NULL,
+            account TEXT NOT NULL,
+            bank_hash TEXT NOT NULL,
+            books_hash TEXT NOT NULL,
+            amt REAL,
+            txn_date TEXT,
+            matched_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_reco_matches_account
+            ON reco_matches (owner, account, matched_at);
+        CREATE TABLE IF NOT EXISTS reco_mappings (
+            owner TEXT NOT NULL,
+            account TEXT NOT NULL,
+            side TEXT NOT NULL,
+            mapping_json TEXT NOT NULL,
+            PRIMARY KEY (owner, account, side)
+        );
+    """)
+    return conn
+
+
+def chunked(values, size=500):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def fingerprint_rows(df):
+    """
+    Normalizes the key columns and adds __hash__, the row identity.
+    The identity is the reference (__ref__) when the row has one, otherwise
+    amount/date/narration plus the occurrence count, so running balances or
+    serial numbers shifting in a re-uploaded ledger do not change it.
+    """
+    df = df.copy()
+
+    for col in RECO_KEY_COLS + ["__ref__"]:
+        if col not in df.columns:
+            df[col] = None
+
+    df["__amt__"] = pd.to_numeric(df["__amt__"], errors="coerce")
+    df["__date__"] = df["__date__"].map(lambda d: None if d is None or pd.isna(d) else str(d))
+    df["__narr__"] = df["__narr__"].map(lambda n: None if n is None or pd.isna(n) else str(n))
+
+    identity = [
+        f"ref:{r}" if r is not None and not pd.isna(r) and str(r).strip() else f"key:{a}|{d}|{n}"
+        for r, a, d, n in zip(df["__ref__"], df["__amt__"], df["__date__"], df["__narr__"])
+    ]
+    occurrence = pd.Series(identity, index=df.index).groupby(identity).cumcount()
+
+    df["__hash__"] = [
+        hashlib.sha1(f"{ident}#{n}".encode("utf-8")).hexdigest()
+        for ident, n in zip(identity, occurrence)
+    ]
+    return df.drop(columns=["__ref__"])
+
+
+def row_json(df):
+    """
+    Serialises the data columns of each row, for display in later runs.
+    """
+    data_cols = [c for c in df.columns if c not in RECO_KEY_COLS + ["__hash__"]]
+    records = json.loads(df[data_cols].to_json(orient="records", date_format="iso"))
+    return [json.dumps(r, sort_keys=True, default=str) for r in records]
+
+
+def filter_new_rows(conn, owner, account, side, df):
+    """
+    Drops rows already stored for this account, so re-uploading an
+    overlapping statement or ledger only processes the delta.
+    """
+    seen = set()
+
+    for chunk in chunked(df["__hash__"]):
+        marks = ",".join("?" * len(chunk))
+        seen.update(
+            h for (h,) in conn.execute(
+                f"SELECT row_hash FROM reco_items "
+                f"WHERE owner = ? AND account = ? AND side = ? AND row_hash IN ({marks})",
+                [owner, account, side, *chunk]
+            )
+        )
+
+    return df[~df["__hash__"].isin(seen)]
+
+
+def load_open_items(conn, owner, account, side, amounts=None):
+    """
+    Loads open items for one side of an account.
+    When amounts is given, only items with those amounts are read.
+    """
+    query = (
+        "SELECT row_hash, amt, txn_date, narr, row_json FROM reco_items "
+        "WHERE owner = ? AND account = ? AND side = ? AND status = 'open'"
+    )
+
+    if amounts is None:
+        rows = conn.execute(
+            query + " ORDER BY added_at, rowid", [owner, account, side]
+        ).fetchall()
+    else:
+        rows = []
+        wanted = {float(a) for a in amounts if pd.notna(a)}
+        for chunk in chunked(wanted):
+            marks = ",".join("?" * len(chunk))
+            rows += conn.execute(
+                query + f" AND amt IN ({marks}) ORDER BY added_at, rowid",
+                [owner, account, side, *chunk]
+            ).fetchall()
+
+    records = []
+    for row_hash, amt, txn_date, narr, data in rows:
+        record = json.loads(data)
+        record.update({
+            "__amt__": amt,
+            "__date__": txn_date,
+            "__narr__": narr,
+            "__hash__": row_hash
+        })
+        records.append(record)
+
+    df = pd.DataFrame(records)
+    for col in RECO_KEY_COLS + ["__hash__"]:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+def load_reco_mappings(conn, owner, account):
+    return {
+        side: json.loads(mapping_json)
+        for side, mapping_json in conn.execute(
+            "SELECT side, mapping_json FROM reco_mappings WHERE owner = ? AND account = ?",
+            [owner, account]
+        )
+    }
+
+
+def reconcile_incremental(conn, owner, account, frames, mappings):
+    """
+    Matches an upload against the saved state of a user's account.
+    frames holds the uploaded "bank" and/or "books" frames with __amt__,
+    __date__, __narr__ and __ref__ filled per mappings; either side may be
+    missing. Rows not seen before are stored, and matched against each other
+    and against open items of the other side with the same amounts. Each
+    row matches at most one row on the other side. Rows without a numeric
+    amount are never stored, as they cannot match.
+    Raises ValueError when a side's mapping differs from the saved one,
+    since row identities and stored keys depend on it.
+    Returns (result, counts) where bank_only/books_only are all open items.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    saved = load_reco_mappings(conn, owner, account)
+
+    for side, mapping in mappings.items():
+        if side in saved and saved[side] != mapping:
+            saved_desc = ", ".join(f"{k}: {v or '-'}" for k, v in saved[side].items())
+            raise ValueError(
+                f"The {side} column mapping differs from the one saved for {account} "
+                f"({saved_desc}). Use the saved mapping, or clear the saved items "
+                f"to start over."
+            )
+
+    all_mappings = {**saved, **mappings}
+    keys = ["__amt__"]
+    if all(m["date"] for m in all_mappings.values()):
+        keys.append("__date__")
+    if all(m["narr"] for m in all_mappings.values()):
+        keys.append("__narr__")
+
+    counts = {"new": 0, "no_amount": 0}
+    empty = pd.DataFrame(columns=RECO_KEY_COLS + ["__hash__"])
+    new = {"bank": empty, "books": empty}
+
+    for side, df in frames.items():
+        df = fingerprint_rows(df)
+        counts["no_amount"] += int(df["__amt__"].isna().sum())
+        df = filter_new_rows(conn, owner, account, side, df[df["__amt__"].notna()])
+        counts["new"] += len(df)
+        new[side] = df
+
+    # 🔹 Candidates must be read before the new rows are stored as open
+    pools = []
+    for side, other in (("bank", "books"), ("books", "bank")):
+        candidates = load_open_items(conn, owner, account, side, new[other]["__amt__"])
+        pool = pd.concat([candidates, new[side]], ignore_index=True)
+        pool["__amt__"] = pd.to_numeric(pool["__amt__"], errors="coerce")
+        pool["__seq__"] = pool.groupby(keys, dropna=False).cumcount()
+        pools.append(pool)
+
+    matched = pools[0].merge(
+        pools[1],
+        how="inner",
+        on=keys + ["__seq__"],
+        suffixes=("_bank", "_books")
+    )
+
+    with conn:
+        for side, mapping in mappings.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO reco_mappings VALUES (?, ?, ?, ?)",
+                [owner, account, side, json.dumps(mapping, sort_keys=True)]
+            )
+
+        for side, df in new.items():
+            conn.executemany(
+                "INSERT INTO reco_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'open', ?)",
+                [
+                    (owner, account, side, h, float(a), d, n, r, now)
+                    for h, a, d, n, r in zip(
+                        df["__hash__"], df["__amt__"], df["__date__"],
+                        df["__narr__"], row_json(df)
+                    )
+                ]
+            )
+
+        for side, col in (("bank", "__hash___bank"), ("books", "__hash___books")):
+            conn.executemany(
+                "UPDATE reco_items SET status = 'matched' "
+                "WHERE owner = ? AND account = ? AND side = ? AND row_hash = ?",
+                [(owner, account, side, h) for h in matched[col]]
+            )
+
+        conn.executemany(
+            "INSERT INTO reco_matches VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (owner, account, bh, kh, float(a), d, now)
+                for bh, kh, a, d in zip(
+                    matched["__hash___bank"],
+                    matched["__hash___books"],
+                    matched["__amt__"],
+                    matched["__date__"] if "__date__" in matched.columns else [None] * len(matched)
+                )
+            ]
+        )
+
+    internal_cols = ["__seq__", "__hash__", "__hash___bank", "__hash___books"]
+
+    def visible(df):
+        return df.drop(columns=[c for c in internal_cols if c in df.columns])
+
+    result = {
+        "matched": visible(matched),
+        "bank_only": visible(load_open_items(conn, owner, account, "bank")),
+        "books_only": visible(load_open_items(conn, owner, account, "books"))
+    }
+
+    return result, counts
+
+
+def clear_reco_state(conn, owner, account):
+    with conn:
+        conn.execute("DELETE FROM reco_items WHERE owner = ? AND account = ?", [owner, account])
+        conn.execute("DELETE FROM reco_matches WHERE owner = ? AND account = ?", [owner, account])
+        conn.execute("DELETE FROM reco_mappings WHERE owner = ? AND account = ?", [owner, account])
+
+
 # ==================================================
 # ================== AUTH SESSION ==================
 # ==================================================
@@ -53,6 +510,12 @@ if "combined_ready" not in st.session_state:
 if "combined_df" not in st.session_state:
     st.session_state.combined_df = None
 
+if "parsed_files" not in st.session_state:
+    st.session_state.parsed_files = {}
+
+if "schema_notes" not in st.session_state:
+    st.session_state.schema_notes = []
+
 if "reco_result" not in st.session_state:
     st.session_state.reco_result = None
 
@@ -202,6 +665,7 @@ with st.sidebar:
         st.session_state.messages = []
         st.session_state.reco_result = None
         st.session_state.combined_df = None
+        st.session_state.parsed_files = {}
         st.rerun()
 
     st.divider()
@@ -338,16 +802,19 @@ if mode == "Excel AI":
         if st.button("🔁 Start New Combine", key="reset_combine_top"):
             st.session_state.combined_ready = False
             st.session_state.combined_df = None
+            st.session_state.parsed_files = {}
+            st.session_state.schema_notes = []
             st.rerun()
 
         # 🔴 Phase-2 Patch: Helper text
         st.info(
-            "📁 Upload 2 or more Excel files with the same column headers. "
+            "📁 Upload 2 or more Excel files. Every sheet is included, and columns are "
+            "matched by name even if renamed in case/spacing or reordered. "
             "The tool will merge them into one combined file."
         )
 
         uploaded_files = st.file_uploader(
-            "Upload Excel files (same headers)",
+            "Upload Excel files",
             type=["xlsx", "xls"],
             accept_multiple_files=True
         )
@@ -357,11 +824,18 @@ if mode == "Excel AI":
             import tempfile
             import os
 
-            dfs = []
-            ref_cols = None
+            frames = []
+            failed = []
+            skipped_notes = []
+            current_keys = set()
 
             for f in uploaded_files:
-                try:
+                # 🔹 Key on content, so a re-exported file with the same name is re-parsed
+                file_key = hashlib.sha1(f.getbuffer()).hexdigest()
+                current_keys.add(file_key)
+
+                # 🔹 Parse each file once; reruns reuse the cached sheets
+                if file_key not in st.session_state.parsed_files:
                     file_name = f.name.lower()
 
                     # 🔹 Save uploaded file to temp location
@@ -369,60 +843,60 @@ if mode == "Excel AI":
                         tmp.write(f.getbuffer())
                         tmp_path = tmp.name
 
-                    if file_name.endswith(".xlsx"):
-                        df = pd.read_excel(tmp_path, engine="openpyxl")
-
-                    elif file_name.endswith(".xls"):
-                        try:
-                            # 1️⃣ Try real Excel
-                            df = pd.read_excel(tmp_path, engine="xlrd")
-                    
-                        except:
-                            try:
-                                # 2️⃣ Try HTML based XLS
-                                df = pd.read_html(tmp_path)[0]
-                    
-                            except:
-                                try:
-                                    # 3️⃣ Try CSV-style disguised XLS (GST / reports)
-                                    df = pd.read_csv(
-                                        tmp_path,
-                                        sep=None,
-                                        engine="python"
-                                    )
-                    
-                                except:
-                                    st.error(
-                                        f"❌ This Excel file could not be processed automatically.\n\n"
-                                        f"Reason: This file is a system-generated report (GST / MIS type).\n\n"
-                                        f"✅ Recommended Fix:\n"
-                                        f"Open the file in Excel → Save As → Excel Workbook (.xlsx)\n"
-                                        f"Then upload again."
-                                    )
-                                    os.unlink(tmp_path)
-                                    st.stop()
-                    else:
-                        st.error(f"❌ Unsupported file type: {f.name}")
+                    try:
+                        sheets, skipped = parse_excel_file(tmp_path, file_name)
+                        st.session_state.parsed_files[file_key] = {
+                            "sheets": sheets,
+                            "skipped": skipped,
+                            "error": None
+                        }
+                    except Exception as e:
+                        st.session_state.parsed_files[file_key] = {
+                            "sheets": {},
+                            "skipped": [],
+                            "error": str(e)
+                        }
+                    finally:
                         os.unlink(tmp_path)
-                        st.stop()
-
-                    os.unlink(tmp_path)
-
-                except Exception as e:
-                    st.error(f"❌ Error reading file: {f.name}")
-                    st.code(str(e))
-                    st.stop()
 
-                if ref_cols is None:
-                    ref_cols = list(df.columns)
+                parsed = st.session_state.parsed_files[file_key]
+
+                if parsed["error"]:
+                    failed.append((f.name, parsed["error"]))
+                    continue
+
+                for sheet_name, df in parsed["sheets"].items():
+                    frames.append((f.name, sheet_name, df))
+
+                for sheet_name in parsed["skipped"]:
+                    skipped_notes.append(
+                        f"{f.name} / {sheet_name}: skipped, no data in the first "
+                        f"{HEADER_SCAN_ROWS} rows;"
+                    )
+
+            # 🔹 Forget files that were removed from the uploader
+            st.session_state.parsed_files = {
+                k: v for k, v in st.session_state.parsed_files.items() if k in current_keys
+            }
+
+            # ⚠️ Bad files are skipped, the rest still combine
+            for name, err in failed:
+                st.warning(
+                    f"⚠️ Skipped {name}: this file could not be processed automatically.\n\n"
+                    f"✅ Recommended Fix:\n"
+                    f"Open the file in Excel → Save As → Excel Workbook (.xlsx)\n"
+                    f"Then upload it again."
+                )
+                st.code(err)
 
-                if list(df.columns) != ref_cols:
-                    st.error(f"❌ Header mismatch in file: {f.name}")
-                    st.stop()
+            if not frames:
+                st.error("❌ None of the uploaded files could be read.")
+                st.stop()
 
-                # ✅ Source file column
-                df["__source_file__"] = f.name
-                dfs.append(df)
+            st.caption(
+                f"📑 {len(frames)} sheet(s) read from "
+                f"{len(uploaded_files) - len(failed)} file(s)."
+            )
 
             # 🔴 BUTTON MUST BE OUTSIDE LOOP
             if st.button("🔄 Combine Files", key="combine_files_btn"):
@@ -431,13 +905,21 @@ if mode == "Excel AI":
                     st.error("🚫 Free usage limit reached.")
                     st.stop()
 
-                st.session_state.combined_df = pd.concat(dfs, ignore_index=True)
+                combined_df, schema_notes = align_frames(frames)
+
+                st.session_state.combined_df = combined_df
+                st.session_state.schema_notes = skipped_notes + schema_notes
                 st.session_state.usage_count += 1
                 st.session_state.combined_ready = True
 
         # 🔴 Preview + Download (separate, stable)
         if st.session_state.combined_ready and st.session_state.combined_df is not None:
 
+            if st.session_state.schema_notes:
+                with st.expander(f"🧩 Schema differences ({len(st.session_state.schema_notes)})"):
+                    for note in st.session_state.schema_notes:
+                        st.write(note)
+
             st.subheader("📄 Preview")
             st.dataframe(st.session_state.combined_df.head(50))
 
@@ -459,26 +941,61 @@ if mode == "Excel AI":
         # 🔴 Phase-2 Patch: Helper text
         st.info(
             "🏦 Match bank statements with books using amount, date, and narration. "
-            "Start with amount only, then add date/narration for better accuracy."
+            "Start with amount only, then add date/narration for better accuracy.\n\n"
+            "Enter an account name to keep unmatched items open and carry them "
+            "forward to the next upload."
         )
 
+        reco_account = st.text_input("Account (optional)", key="reco_account").strip()
+
+        if reco_account:
+            confirm_clear = st.checkbox(
+                f"I want to delete all open items and match history for {reco_account}",
+                key="confirm_clear_reco"
+            )
+
+        if reco_account and st.button("🗑️ Clear Saved Items for Account", disabled=not confirm_clear):
+            conn = open_reco_db()
+            try:
+                clear_reco_state(conn, st.session_state.user_email, reco_account)
+            finally:
+                conn.close()
+            st.session_state.reco_result = None
+            st.success(f"✅ Saved items cleared for {reco_account}.")
+
         bank_file = st.file_uploader("Upload Bank Statement", type=["xlsx"])
         books_file = st.file_uploader("Upload Books Ledger", type=["xlsx"])
 
-        if bank_file and books_file:
+        if reco_account:
+            st.caption(
+                "With an account, either file is optional: an upload is matched "
+                "against the saved open items of the other side. Pick a reference "
+                "column (UTR / cheque / voucher no.) so repeated amounts are told apart."
+            )
+
+        if (bank_file and books_file) or (reco_account and (bank_file or books_file)):
 
-            bank = pd.read_excel(bank_file)
-            books = pd.read_excel(books_file)
+            bank = pd.read_excel(bank_file) if bank_file else None
+            books = pd.read_excel(books_file) if books_file else None
 
             st.markdown("### Column Mapping")
 
-            bank_amt = st.selectbox("Bank Amount", [""] + list(bank.columns))
-            bank_date = st.selectbox("Bank Date (Optional)", [""] + list(bank.columns))
-            bank_narr = st.selectbox("Bank Narration (Optional)", [""] + list(bank.columns))
+            bank_amt = bank_date = bank_narr = bank_ref = ""
+            books_amt = books_date = books_narr = books_ref = ""
+
+            if bank is not None:
+                bank_amt = st.selectbox("Bank Amount", [""] + list(bank.columns))
+                bank_date = st.selectbox("Bank Date (Optional)", [""] + list(bank.columns))
+                bank_narr = st.selectbox("Bank Narration (Optional)", [""] + list(bank.columns))
+                if reco_account:
+                    bank_ref = st.selectbox("Bank Reference (Optional)", [""] + list(bank.columns))
 
-            books_amt = st.selectbox("Books Amount", [""] + list(books.columns))
-            books_date = st.selectbox("Books Date (Optional)", [""] + list(books.columns))
-            books_narr = st.selectbox("Books Narration (Optional)", [""] + list(books.columns))
+            if books is not None:
+                books_amt = st.selectbox("Books Amount", [""] + list(books.columns))
+                books_date = st.selectbox("Books Date (Optional)", [""] + list(books.columns))
+                books_narr = st.selectbox("Books Narration (Optional)", [""] + list(books.columns))
+                if reco_account:
+                    books_ref = st.selectbox("Books Reference (Optional)", [""] + list(books.columns))
 
             if st.button("🔄 Run Reconciliation"):
 
@@ -497,39 +1014,88 @@ if mode == "Excel AI":
                 def norm_text(x):
                     return "" if pd.isna(x) else str(x).lower().strip()
 
-                bank["__amt__"] = bank[bank_amt].apply(norm_amt)
-                books["__amt__"] = books[books_amt].apply(norm_amt)
-
-                keys = ["__amt__"]
-
-                if bank_date and books_date:
-                    bank["__date__"] = bank[bank_date].apply(norm_date)
-                    books["__date__"] = books[books_date].apply(norm_date)
-                    keys.append("__date__")
-
-                if bank_narr and books_narr:
-                    bank["__narr__"] = bank[bank_narr].apply(norm_text)
-                    books["__narr__"] = books[books_narr].apply(norm_text)
-                    keys.append("__narr__")
-
-                reco = bank.merge(
-                    books,
-                    how="outer",
-                    left_on=keys,
-                    right_on=keys,
-                    indicator=True,
-                    suffixes=("_bank", "_books")
-                )
-
-                matched = reco[reco["_merge"] == "both"].copy()
-                bank_only = reco[reco["_merge"] == "left_only"].copy()
-                books_only = reco[reco["_merge"] == "right_only"].copy()
-
-                st.session_state.reco_result = {
-                    "matched": matched,
-                    "bank_only": bank_only,
-                    "books_only": books_only
-                }
+                if reco_account:
+                    # 🔹 Match only new rows against saved open items
+                    frames = {}
+                    mappings = {}
+
+                    for side, df, amt, date, narr, ref in (
+                        ("bank", bank, bank_amt, bank_date, bank_narr, bank_ref),
+                        ("books", books, books_amt, books_date, books_narr, books_ref)
+                    ):
+                        if df is None:
+                            continue
+
+                        df["__amt__"] = df[amt].apply(norm_amt)
+                        if date:
+                            df["__date__"] = df[date].apply(norm_date)
+                        if narr:
+                            df["__narr__"] = df[narr].apply(norm_text)
+                        if ref:
+                            df["__ref__"] = df[ref].apply(norm_text)
+
+                        frames[side] = df
+                        mappings[side] = {
+                            "amt": str(amt), "date": str(date), "narr": str(narr), "ref": str(ref)
+                        }
+
+                    conn = open_reco_db()
+                    try:
+                        reco_result, counts = reconcile_incremental(
+                            conn, st.session_state.user_email, reco_account, frames, mappings
+                        )
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                        st.stop()
+                    finally:
+                        conn.close()
+
+                    st.session_state.reco_result = reco_result
+                    st.caption(
+                        f"🆕 New rows this upload: {counts['new']}. "
+                        f"Open items are carried forward."
+                    )
+
+                    if counts["no_amount"]:
+                        st.warning(
+                            f"⚠️ {counts['no_amount']} row(s) without a numeric amount "
+                            f"(opening balance, totals, blank lines) were not saved."
+                        )
+
+                else:
+                    bank["__amt__"] = bank[bank_amt].apply(norm_amt)
+                    books["__amt__"] = books[books_amt].apply(norm_amt)
+
+                    keys = ["__amt__"]
+
+                    if bank_date and books_date:
+                        bank["__date__"] = bank[bank_date].apply(norm_date)
+                        books["__date__"] = books[books_date].apply(norm_date)
+                        keys.append("__date__")
+
+                    if bank_narr and books_narr:
+                        bank["__narr__"] = bank[bank_narr].apply(norm_text)
+                        books["__narr__"] = books[books_narr].apply(norm_text)
+                        keys.append("__narr__")
+
+                    reco = bank.merge(
+                        books,
+                        how="outer",
+                        left_on=keys,
+                        right_on=keys,
+                        indicator=True,
+                        suffixes=("_bank", "_books")
+                    )
+
+                    matched = reco[reco["_merge"] == "both"].copy()
+                    bank_only = reco[reco["_merge"] == "left_only"].copy()
+                    books_only = reco[reco["_merge"] == "right_only"].copy()
+
+                    st.session_state.reco_result = {
+                        "matched": matched,
+                        "bank_only": bank_only,
+                        "books_only": books_only
+                    }
 
                 st.session_state.usage_count += 1
 